@@ -4,80 +4,298 @@ Handles text chunking and similarity search without any heavy dependencies.
 """
 import re
 import math
+import asyncio
+import logging
+import heapq
+import bisect
+import os
+import json
+import zlib
+import sqlite3
+import hashlib
+import tempfile
+import time
+from functools import lru_cache
+from array import array
 from collections import Counter
-from typing import List, Tuple, Optional, Dict
+from typing import List, Tuple, Optional, Dict, Iterable, Iterator
 
-from utils import split_text_into_chunks, count_tokens
+from utils import split_text_into_chunk_spans, count_tokens, env_int
+
+logger = logging.getLogger(f"hackrx.{__name__}")
+
+# Bump when the cached index layout or chunking parameters change
+INDEX_CACHE_VERSION = "tfidf-v7"
+CHUNK_SIZE = 300
+CHUNK_OVERLAP = 100
+QUERY_CACHE_SIZE = 512
+# Indexes kept in the on-disk cache; the least recently used are deleted beyond this
+INDEX_CACHE_MAX_ENTRIES = env_int("INDEX_CACHE_MAX_ENTRIES", 32, minimum=1)
+
+# Strong references to in-flight background cache writes so they are not garbage collected
+_cache_writes = set()
+
+# Words of three or more characters; shorter tokens are never indexed
+TOKEN_PATTERN = re.compile(r'\b\w{3,}\b')
+
+STOP_WORDS = frozenset({'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'shall', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them'})
+
+class ChunkStore:
+    """Read-only sequence of chunks stored as one string plus (start, end) offsets"""
+    
+    def __init__(self, text: str = "", spans: Iterable[Tuple[int, int]] = ()):
+        # Overlapping chunks slice the same backing string instead of each holding a copy
+        self.text = text
+        self.starts = array('I')
+        self.ends = array('I')
+        for start, end in spans:
+            self.starts.append(start)
+            self.ends.append(end)
+    
+    def __len__(self) -> int:
+        return len(self.starts)
+    
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        return self.text[self.starts[idx]:self.ends[idx]]
+    
+    def __iter__(self):
+        for start, end in zip(self.starts, self.ends):
+            yield self.text[start:end]
+    
+    def spans(self) -> List[Tuple[int, int]]:
+        """Chunk offsets as (start, end) pairs"""
+        return list(zip(self.starts, self.ends))
+
+class CSRMatrix:
+    """
+    Compressed sparse rows in flat typed arrays: row i holds
+    indices[indptr[i]:indptr[i + 1]] and the matching data entries.
+    
+    Values are stored as float32, which is ample precision for TF-IDF weights and
+    halves the bytes walked per posting compared with float64.
+    """
+    
+    def __init__(self, indptr: Iterable[int] = (0,), indices: Iterable[int] = (), data: Iterable[float] = ()):
+        self.indptr = array('I', indptr)
+        self.indices = array('I', indices)
+        self.data = array('f', data)
+    
+    def __len__(self) -> int:
+        return len(self.indptr) - 1
+    
+    @property
+    def nnz(self) -> int:
+        return len(self.indices)
+    
+    def row(self, i: int) -> Iterator[Tuple[int, float]]:
+        """(column, value) pairs of row i"""
+        start, end = self.indptr[i], self.indptr[i + 1]
+        return zip(self.indices[start:end], self.data[start:end])
+    
+    def append_row(self, entries: Iterable[Tuple[int, float]]) -> None:
+        for col, value in entries:
+            self.indices.append(col)
+            self.data.append(value)
+        self.indptr.append(len(self.indices))
+    
+    def transpose(self, num_cols: int) -> "CSRMatrix":
+        """Column-major copy (CSC), built with a counting sort over column indices"""
+        offsets = [0] * (num_cols + 1)
+        for col in self.indices:
+            offsets[col + 1] += 1
+        for col in range(num_cols):
+            offsets[col + 1] += offsets[col]
+        
+        transposed = CSRMatrix(offsets)
+        transposed.indices = array('I', [0]) * self.nnz
+        transposed.data = array('f', [0.0]) * self.nnz
+        
+        # Rows are visited in order, so each output row stays sorted by original row index
+        next_slot = offsets[:-1]
+        for row_idx in range(len(self)):
+            for k in range(self.indptr[row_idx], self.indptr[row_idx + 1]):
+                col = self.indices[k]
+                slot = next_slot[col]
+                transposed.indices[slot] = row_idx
+                transposed.data[slot] = self.data[k]
+                next_slot[col] = slot + 1
+        return transposed
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _query_term_counts(query: str) -> Tuple[Counter, int]:
+    """
+    Tokenized term counts and length of a query, memoized in a small LRU.
+    
+    Tokenization does not depend on the document, so the cache is shared by every
+    embedder and a question asked about several documents is tokenized once.
+    """
+    words = [w for w in map(str.lower, TOKEN_PATTERN.findall(query)) if w not in STOP_WORDS]
+    return Counter(words), len(words)
 
 class SimpleEmbedder:
     """Handles text similarity search using lightweight TF-IDF"""
     
     def __init__(self):
-        self.chunks = []
+        self.chunks = ChunkStore()
         self.vocabulary = {}
         self.tfidf_matrix = None
-        self.stop_words = {'the', 'a', 'an', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by', 'is', 'are', 'was', 'were', 'be', 'been', 'have', 'has', 'had', 'do', 'does', 'did', 'will', 'would', 'could', 'should', 'may', 'might', 'must', 'shall', 'can', 'this', 'that', 'these', 'those', 'i', 'you', 'he', 'she', 'it', 'we', 'they', 'me', 'him', 'her', 'us', 'them'}
+        self.postings = CSRMatrix()
+        self.cache_path = os.getenv(
+            "INDEX_CACHE_PATH",
+            os.path.join(tempfile.gettempdir(), "hackrx_index_cache.db")
+        )
+        self.stop_words = STOP_WORDS
     
     def _tokenize(self, text: str) -> List[str]:
         """Simple tokenization and stop word removal"""
-        words = re.findall(r'\b\w+\b', text.lower())
-        return [w for w in words if w not in self.stop_words and len(w) > 2]
-    
-    def _build_vocabulary(self, chunks: List[str]) -> Dict[str, int]:
-        """Build vocabulary from all chunks"""
-        all_words = set()
-        for chunk in chunks:
-            words = self._tokenize(chunk)
-            all_words.update(words)
-        return {word: idx for idx, word in enumerate(sorted(all_words))}
-    
-    def _compute_tf_idf(self, chunks: List[str]) -> List[List[float]]:
-        """Compute TF-IDF matrix using pure Python lists"""
-        vocab_size = len(self.vocabulary)
-        num_docs = len(chunks)
-        
-        # Initialize TF-IDF matrix as list of lists
-        tfidf_matrix = [[0.0 for _ in range(vocab_size)] for _ in range(num_docs)]
-        
-        # Document frequency for each term
-        df = [0 for _ in range(vocab_size)]
-        
-        # Compute term frequencies and document frequencies
-        for doc_idx, chunk in enumerate(chunks):
-            words = self._tokenize(chunk)
+        # Lowercase matched tokens only, rather than copying the whole text first
+        words = map(str.lower, TOKEN_PATTERN.findall(text))
+        return [w for w in words if w not in self.stop_words]
+    
+    def _tokenize_chunks(self, chunks: ChunkStore) -> Iterator[List[str]]:
+        """
+        Token lists for every chunk, tokenizing the shared backing text only once.
+        
+        Chunks overlap, so tokenizing each chunk separately would scan the overlap
+        regions twice. Chunk boundaries fall on spaces and tokens never span one,
+        so a chunk's tokens are exactly the document tokens that start inside it.
+        """
+        token_starts = array('I')
+        tokens = []
+        for match in TOKEN_PATTERN.finditer(chunks.text):
+            word = match.group().lower()
+            if word not in self.stop_words:
+                token_starts.append(match.start())
+                tokens.append(word)
+        
+        for start, end in chunks.spans():
+            yield tokens[bisect.bisect_left(token_starts, start):bisect.bisect_left(token_starts, end)]
+    
+    def _compute_tf_idf(self, chunk_tokens: Iterable[List[str]]) -> CSRMatrix:
+        """
+        Compute the TF-IDF matrix as compressed sparse rows from per-chunk tokens.
+        
+        The vocabulary grows as new terms are seen, in the same pass that fills
+        the TF rows.
+        """
+        self.vocabulary = vocabulary = {}
+        
+        # Only non-zero entries are stored, in flat typed arrays, so memory grows with
+        # the number of tokens rather than with num_docs x vocabulary size
+        tf_matrix = CSRMatrix()
+        
+        # Compute term frequencies
+        for words in chunk_tokens:
             word_counts = Counter(words)
-            doc_length = len(words)
-            
-            # Track which terms appear in this document
-            terms_in_doc = set()
-            
-            for word, count in word_counts.items():
-                if word in self.vocabulary:
-                    term_idx = self.vocabulary[word]
-                    # TF: term frequency
-                    tf = count / doc_length if doc_length > 0 else 0
-                    tfidf_matrix[doc_idx][term_idx] = tf
-                    
-                    # Track for DF calculation
-                    terms_in_doc.add(term_idx)
+            doc_length = len(words) or 1
             
-            # Update document frequencies
-            for term_idx in terms_in_doc:
-                df[term_idx] += 1
+            # TF: term frequency, assigning ids to unseen terms as they appear
+            tf_row = [
+                (vocabulary.setdefault(word, len(vocabulary)), count / doc_length)
+                for word, count in word_counts.items()
+            ]
+            tf_matrix.append_row(tf_row)
         
-        # Compute IDF and final TF-IDF
-        for term_idx in range(vocab_size):
-            if df[term_idx] > 0:
-                idf = math.log(num_docs / df[term_idx])
-                for doc_idx in range(num_docs):
-                    tfidf_matrix[doc_idx][term_idx] *= idf
+        # Document frequency for each term: rows hold each term at most once, so this
+        # is just a count of column indices over the stored entries
+        df = Counter(tf_matrix.indices)
+        
+        # Compute IDF and final TF-IDF, dropping terms that occur in every chunk (idf == 0)
+        num_docs = len(tf_matrix)
+        idf = [math.log(num_docs / df[term_idx]) for term_idx in range(len(vocabulary))]
+        tfidf_matrix = CSRMatrix()
+        for doc_idx in range(num_docs):
+            row = [(term_idx, tf * idf[term_idx]) for term_idx, tf in tf_matrix.row(doc_idx) if tf and idf[term_idx]]
+            
+            # L2-normalize once so cosine similarity at query time is a plain dot product
+            norm = math.sqrt(sum(w * w for _, w in row))
+            if norm:
+                row = [(term_idx, w / norm) for term_idx, w in row]
+            tfidf_matrix.append_row(row)
         
         return tfidf_matrix
 
+    def _cache_key(self, text: str) -> str:
+        """Content hash identifying an index built from this text"""
+        prefix = f"{INDEX_CACHE_VERSION}:{CHUNK_SIZE}:{CHUNK_OVERLAP}:"
+        return hashlib.sha256((prefix + text).encode("utf-8")).hexdigest()
+
+    def _connect_cache(self) -> sqlite3.Connection:
+        """Open the on-disk index cache, creating the table on first use"""
+        conn = sqlite3.connect(self.cache_path)
+        conn.execute("CREATE TABLE IF NOT EXISTS tfidf_cache (key TEXT PRIMARY KEY, data BLOB, last_used REAL)")
+        return conn
+
+    def _load_cached_index(self, key: str) -> bool:
+        """Restore chunks, vocabulary and TF-IDF matrix from the cache if present"""
+        try:
+            conn = self._connect_cache()
+            try:
+                row = conn.execute("SELECT data FROM tfidf_cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    with conn:
+                        conn.execute("UPDATE tfidf_cache SET last_used = ? WHERE key = ?", (time.time(), key))
+            finally:
+                conn.close()
+            if row is None:
+                return False
+            
+            payload = json.loads(zlib.decompress(row[0]).decode("utf-8"))
+            self.chunks = ChunkStore(payload["text"], payload["spans"])
+            self.vocabulary = payload["vocabulary"]
+            
+            matrix = payload["matrix"]
+            self.tfidf_matrix = CSRMatrix(matrix["indptr"], matrix["indices"], matrix["data"])
+            return True
+            
+        except Exception as e:
+            logger.warning("⚠️ Could not read index cache: %s", e)
+            return False
+
+    def _store_cached_index(self, key: str) -> None:
+        """Persist the current chunks, vocabulary and TF-IDF matrix, evicting the least recently used"""
+        try:
+            payload = {
+                "text": self.chunks.text,
+                "spans": self.chunks.spans(),
+                "vocabulary": self.vocabulary,
+                "matrix": {
+                    "indptr": self.tfidf_matrix.indptr.tolist(),
+                    "indices": self.tfidf_matrix.indices.tolist(),
+                    "data": self.tfidf_matrix.data.tolist()
+                }
+            }
+            data = zlib.compress(json.dumps(payload).encode("utf-8"))
+            conn = self._connect_cache()
+            try:
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO tfidf_cache (key, data, last_used) VALUES (?, ?, ?)",
+                        (key, data, time.time())
+                    )
+                    conn.execute(
+                        "DELETE FROM tfidf_cache WHERE key NOT IN "
+                        "(SELECT key FROM tfidf_cache ORDER BY last_used DESC LIMIT ?)",
+                        (INDEX_CACHE_MAX_ENTRIES,)
+                    )
+            finally:
+                conn.close()
+                
+        except Exception as e:
+            logger.warning("⚠️ Could not write index cache: %s", e)
+
     async def create_faiss_index(self, text: str):
         """
         Create similarity index from text content using lightweight TF-IDF.
         
+        Indexes are cached on disk keyed by a hash of the text, so re-processing
+        the same document (e.g. after a restart) skips chunking and TF-IDF
+        computation. The build runs in a worker thread so the event loop keeps
+        serving other requests meanwhile, and a fresh index is written to the disk
+        cache in the background after it is returned.
+        
         Args:
             text: Input text to process
             
@@ -85,56 +303,136 @@ class SimpleEmbedder:
             Similarity index for search
         """
         try:
-            print("🔪 Splitting text into optimized chunks...")
-            # Split text into chunks
-            self.chunks = split_text_into_chunks(text, chunk_size=300, overlap=100)
-            
-            if not self.chunks:
-                raise ValueError("No chunks created from text")
-            
-            print(f"📦 Created {len(self.chunks)} optimized chunks")
-            
-            # Build vocabulary
-            print("📚 Building vocabulary...")
-            self.vocabulary = self._build_vocabulary(self.chunks)
-            
-            # Create TF-IDF vectors
-            print("🧠 Creating lightweight TF-IDF vectors...")
-            self.tfidf_matrix = self._compute_tf_idf(self.chunks)
-            
-            print(f"✅ TF-IDF index created with {len(self.chunks)} vectors")
+            cache_key = await asyncio.to_thread(self._build_index, text)
+            if cache_key is not None:
+                write = asyncio.create_task(asyncio.to_thread(self._store_cached_index, cache_key))
+                _cache_writes.add(write)
+                write.add_done_callback(_cache_writes.discard)
             return self.tfidf_matrix
             
         except Exception as e:
-            print(f"❌ Error creating similarity index: {str(e)}")
+            logger.error("❌ Error creating similarity index: %s", e)
             raise
     
-    def _cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
-        """Compute cosine similarity between two vectors"""
-        dot_product = sum(a * b for a, b in zip(vec1, vec2))
-        norm1 = math.sqrt(sum(a * a for a in vec1))
-        norm2 = math.sqrt(sum(b * b for b in vec2))
+    def _build_index(self, text: str) -> Optional[str]:
+        """
+        Chunk the text and compute its TF-IDF index, or load it from the disk cache.
+        
+        Returns the cache key to persist the index under when it was freshly built,
+        or None when it came from the cache.
+        """
+        cache_key = self._cache_key(text)
+        if self._load_cached_index(cache_key):
+            self._build_inverted_index()
+            logger.info("♻️ Loaded cached TF-IDF index with %d vectors", len(self.chunks))
+            return None
+        
+        logger.info("🔪 Splitting text into optimized chunks...")
+        # Split text into chunks
+        cleaned_text, spans = split_text_into_chunk_spans(text, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP)
+        self.chunks = ChunkStore(cleaned_text, spans)
+        
+        if not self.chunks:
+            raise ValueError("No chunks created from text")
+        
+        logger.info("📦 Created %d optimized chunks", len(self.chunks))
+        
+        # Build vocabulary and TF-IDF vectors from a single tokenization pass over the text
+        logger.info("🧠 Creating lightweight TF-IDF vectors...")
+        self.tfidf_matrix = self._compute_tf_idf(self._tokenize_chunks(self.chunks))
+        self._build_inverted_index()
+        
+        logger.info("✅ TF-IDF index created with %d vectors", len(self.chunks))
+        return cache_key
+    
+    def _build_inverted_index(self) -> None:
+        """Build term -> (chunk_idx, weight) postings as the transpose of the normalized rows"""
+        self.postings = self.tfidf_matrix.transpose(len(self.vocabulary))
+
+    def _score_queries(self, query_vectors: List[Dict[int, float]]) -> List[Dict[int, float]]:
+        """
+        Cosine similarity of several queries against the chunks via the inverted index.
         
-        if norm1 == 0 or norm2 == 0:
-            return 0.0
+        Chunk rows are already unit length, so only the query norms are divided out.
+        Query terms are grouped by term first, so each posting list is walked once
+        for the whole batch even when several questions share a term. Scores are
+        sparse {chunk_idx: similarity} accumulators: chunks that share no term with
+        a query are never touched and implicitly score 0.0.
+        """
+        # term_idx -> [(query_idx, normalized query weight)]
+        term_queries = {}
+        for q_idx, query_vector in enumerate(query_vectors):
+            query_terms = [(term_idx, weight) for term_idx, weight in query_vector.items() if weight]
+            query_norm = math.sqrt(sum(w * w for _, w in query_terms))
+            if query_norm > 0:
+                for term_idx, weight in query_terms:
+                    term_queries.setdefault(term_idx, []).append((q_idx, weight / query_norm))
         
-        return dot_product / (norm1 * norm2)
+        scores = [{} for _ in query_vectors]
+        for term_idx, weighted_queries in term_queries.items():
+            for chunk_idx, chunk_weight in self.postings.row(term_idx):
+                for q_idx, query_weight in weighted_queries:
+                    query_scores = scores[q_idx]
+                    query_scores[chunk_idx] = query_scores.get(chunk_idx, 0.0) + query_weight * chunk_weight
+        
+        return scores
 
-    def _query_to_vector(self, query: str) -> List[float]:
-        """Convert query to TF-IDF vector"""
-        words = self._tokenize(query)
-        word_counts = Counter(words)
-        query_length = len(words)
+    def _query_to_vector(self, query: str) -> Dict[int, float]:
+        """
+        Convert query to a sparse TF vector {term_idx: tf}, ordered by term index.
         
-        query_vector = [0.0 for _ in range(len(self.vocabulary))]
+        Only the query's own terms are stored, so the cost does not grow with the
+        vocabulary size.
+        """
+        word_counts, query_length = _query_term_counts(query)
         
+        query_terms = []
         for word, count in word_counts.items():
-            if word in self.vocabulary:
-                term_idx = self.vocabulary[word]
-                tf = count / query_length if query_length > 0 else 0
-                query_vector[term_idx] = tf
+            term_idx = self.vocabulary.get(word)
+            if term_idx is not None:
+                query_terms.append((term_idx, count / query_length))
         
-        return query_vector
+        return dict(sorted(query_terms))
+
+    def embed_queries(self, queries: List[str]) -> List[Dict[int, float]]:
+        """Convert a batch of queries to sparse TF-IDF vectors"""
+        return [self._query_to_vector(query) for query in queries]
+
+    def _select_chunks(self, scores: Dict[int, float], top_k: int) -> List[str]:
+        """Pick the top-k chunks from sparse {chunk_idx: similarity} scores with fallbacks"""
+        # Partial selection over scored chunks only; ties go to the earlier chunk
+        top = heapq.nlargest(top_k, scores.items(), key=lambda item: (item[1], -item[0]))
+        
+        # Pad with unscored (0.0) chunks in document order, as a full ranking would
+        for idx in range(len(self.chunks)):
+            if len(top) >= top_k:
+                break
+            if idx not in scores:
+                top.append((idx, 0.0))
+        top_indices = [idx for idx, _ in top]
+        
+        # Get the actual chunks, using a very permissive threshold so we always have some context
+        similar_chunks = [self.chunks[idx] for idx, sim_score in top if sim_score > 0.01]
+        
+        # Fallback: if nothing passed the threshold, still return the top_k chunks
+        if not similar_chunks:
+            for idx in top_indices:
+                similar_chunks.append(self.chunks[idx])
+        
+        # Final safeguard: if for some reason we still have none, return first few chunks
+        if not similar_chunks and self.chunks:
+            similar_chunks = self.chunks[:max(3, min(top_k, len(self.chunks)))]
+        
+        return similar_chunks
+
+    def _rank_chunks(self, query_vectors: List[Dict[int, float]], top_k: int) -> List[List[str]]:
+        """
+        Score query vectors and pick each one's top-k chunks.
+        
+        Only reads the built index, so it is safe to run in a worker thread while
+        other requests search the same document.
+        """
+        return [self._select_chunks(sims, top_k) for sims in self._score_queries(query_vectors)]
 
     async def search_similar_chunks(
         self, 
@@ -157,41 +455,42 @@ class SimpleEmbedder:
             # Transform query to TF-IDF vector
             query_vector = self._query_to_vector(query)
             
-            # Calculate similarities with all chunks
-            similarities = []
-            for i in range(len(self.tfidf_matrix)):
-                chunk_vector = self.tfidf_matrix[i]
-                similarity = self._cosine_similarity(query_vector, chunk_vector)
-                similarities.append((similarity, i))
-            
-            # Sort by similarity and get top-k indices
-            similarities.sort(reverse=True, key=lambda x: x[0])
-            top_indices = [idx for _, idx in similarities[:top_k]]
-            
-            # Get the actual chunks
-            similar_chunks = []
-            for idx in top_indices:
-                # Find the similarity score for this index
-                sim_score = next((sim for sim, i in similarities if i == idx), 0)
-                # Use a very permissive threshold so we always have some context
-                if sim_score > 0.01:
-                    similar_chunks.append(self.chunks[idx])
-            
-            # Fallback: if nothing passed the threshold, still return the top_k chunks
-            if not similar_chunks:
-                for idx in top_indices:
-                    similar_chunks.append(self.chunks[idx])
-            
-            # Final safeguard: if for some reason we still have none, return first few chunks
-            if not similar_chunks and self.chunks:
-                similar_chunks = self.chunks[:max(3, min(top_k, len(self.chunks)))]
+            # Score and rank through the inverted index off the event loop
+            similar_chunks = (await asyncio.to_thread(self._rank_chunks, [query_vector], top_k))[0]
 
-            print(f"🔍 Found {len(similar_chunks)} similar chunks for query")
+            logger.info("🔍 Found %d similar chunks for query", len(similar_chunks))
             return similar_chunks
             
         except Exception as e:
-            print(f"❌ Error searching similar chunks: {str(e)}")
+            logger.error("❌ Error searching similar chunks: %s", e)
             return []
+
+    async def search_similar_chunks_batch(
+        self, 
+        index, 
+        queries: List[str], 
+        top_k: int = 5
+    ) -> List[List[str]]:
+        """
+        Search for similar chunks for several queries in one batched scoring pass.
+        
+        Args:
+            index: TF-IDF matrix
+            queries: Search queries
+            top_k: Number of top results to return per query
+            
+        Returns:
+            One list of most similar text chunks per query, in query order
+        """
+        try:
+            query_vectors = self.embed_queries(queries)
+            results = await asyncio.to_thread(self._rank_chunks, query_vectors, top_k)
+            logger.info("🔍 Retrieved chunks for %d queries", len(queries))
+            return results
+            
+        except Exception as e:
+            logger.error("❌ Error searching similar chunks: %s", e)
+            return [[] for _ in queries]
     
     def get_chunk_info(self) -> dict:
         """Get information about the processed chunks"""
@@ -214,7 +513,8 @@ class SimpleEmbedder:
         return {
             "index_created": True,
             "num_vectors": len(self.tfidf_matrix),
-            "feature_dimension": len(self.tfidf_matrix[0]) if self.tfidf_matrix else 0,
+            "feature_dimension": len(self.vocabulary),
+            "non_zero_entries": self.tfidf_matrix.nnz,
             "vocabulary_size": len(self.vocabulary),
-            "index_type": "Pure Python TF-IDF"
+            "index_type": "Pure Python sparse TF-IDF"
         }
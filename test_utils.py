@@ -0,0 +1,41 @@
+"""
+Tests for the text utilities.
+"""
+from utils import CLAUSE_PATTERNS, extract_clauses
+
+SAMPLE_TEXT = (
+    "Section 4: Benefits apply here. Clause 7 Grace period is thirty days. "
+    "2. Maternity expenses are excluded. Article 12. Waiting periods apply to all claims. "
+    "The policy renews every year."
+)
+
+EXPECTED_CLAUSES = [
+    ("Section 4: Benefits apply here.", 0, 31),
+    ("Clause 7 Grace period is thirty days.", 32, 69),
+    ("Article 12. Waiting periods apply to all claims.", 106, 154),
+    ("2. Maternity expenses are excluded.", 70, 105),
+    ("12. Waiting periods apply to all claims.", 114, 154),
+    ("Maternity expenses are excluded.", 73, 105),
+    ("Article 12.", 106, 117),
+    ("Waiting periods apply to all claims.", 118, 154),
+    ("The policy renews every year.", 155, 184),
+]
+
+def test_extract_clauses_keeps_every_distinct_span():
+    clauses = extract_clauses(SAMPLE_TEXT)
+
+    assert [(clause['text'], clause['start'], clause['end']) for clause in clauses] == EXPECTED_CLAUSES
+
+def test_extract_clauses_drops_duplicate_spans():
+    # "Section 4: ..." and "Clause 7 ..." are also found by the generic sentence pattern
+    clauses = extract_clauses("Section 4: Benefits apply here. Clause 7 Grace period is thirty days.")
+
+    assert [(clause['text'], clause['start'], clause['end']) for clause in clauses] == [
+        ("Section 4: Benefits apply here.", 0, 31),
+        ("Clause 7 Grace period is thirty days.", 32, 69),
+    ]
+
+def test_extract_clauses_reports_most_specific_pattern_for_shared_span():
+    clauses = extract_clauses("Section 4: Benefits apply here.")
+
+    assert [clause['pattern'] for clause in clauses] == [CLAUSE_PATTERNS[0].pattern]
@@ -2,17 +2,57 @@
 Utility functions for text processing, chunking, and tokenization.
 """
 import re
-from typing import List, Dict, Any
+import os
+import logging
+from collections import deque
+from typing import List, Dict, Any, Tuple, Iterator, Optional
 # import tiktoken  # Removed for Render compatibility
 
+logger = logging.getLogger(f"hackrx.{__name__}")
+
+WORD_PATTERN = re.compile(r'[^ ]+')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+# Anything other than word characters, whitespace and common punctuation
+SPECIAL_CHARS_PATTERN = re.compile(r'[^\w\s\.\,\;\:\!\?\-\(\)\[\]\{\}]')
+
+# Clause-like structures, from most to least specific
+CLAUSE_PATTERNS = [
+    re.compile(pattern, re.MULTILINE | re.DOTALL)
+    for pattern in (
+        r'(?:Clause|Section|Article)\s+\d+[\.:]?\s*[A-Z][^.]*\.',
+        r'\d+\.\s*[A-Z][^.]*\.',
+        r'[A-Z][^.]*\.',
+    )
+]
+
+def env_int(name: str, default: int, minimum: Optional[int] = None) -> int:
+    """
+    Integer setting from the environment (or .env).
+    
+    Malformed values fall back to default and values below minimum are raised to it,
+    each with a warning, so a bad setting never stops the app from starting.
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        logger.warning("⚠️ %s=%r is not an integer, using %d", name, value, default)
+        return default
+    if minimum is not None and number < minimum:
+        logger.warning("⚠️ %s=%d is below %d, using %d", name, number, minimum, minimum)
+        return minimum
+    return number
+
 def clean_text(text: str) -> str:
     """
     Clean and normalize text by removing extra whitespace and special characters.
     """
     # Remove extra whitespace
-    text = re.sub(r'\s+', ' ', text)
+    text = WHITESPACE_PATTERN.sub(' ', text)
     # Remove special characters but keep punctuation
-    text = re.sub(r'[^\w\s\.\,\;\:\!\?\-\(\)\[\]\{\}]', '', text)
+    text = SPECIAL_CHARS_PATTERN.sub('', text)
     return text.strip()
 
 def split_text_into_chunks(text: str, chunk_size: int = 500, overlap: int = 50) -> List[str]:
@@ -30,24 +70,48 @@ def split_text_into_chunks(text: str, chunk_size: int = 500, overlap: int = 50)
     # Clean the text first
     text = clean_text(text)
     
-    # Clean the text first
-    text = clean_text(text)
-    
-    # Simple word-based chunking (no tiktoken dependency)
+    # Simple word-based chunking (no tiktoken dependency). The text is already clean,
+    # so each chunk is just its words re-joined; every stride start has at least one word
     words = text.split()
-    chunks = []
+    return [' '.join(words[i:i + chunk_size]) for i in range(0, len(words), chunk_size - overlap)]
+
+def split_text_into_chunk_spans(text: str, chunk_size: int = 500, overlap: int = 50) -> Tuple[str, Iterator[Tuple[int, int]]]:
+    """
+    Split text like split_text_into_chunks, but return the cleaned text once plus a
+    lazy stream of (start, end) character offsets of each chunk, so overlapping
+    chunks share storage and no per-word list is materialized.
     
-    for i in range(0, len(words), chunk_size - overlap):
-        chunk_words = words[i:i + chunk_size]
-        chunk_text = ' '.join(chunk_words)
-        
-        # Clean the chunk text
-        chunk_text = clean_text(chunk_text)
+    Args:
+        text: Input text to split
+        chunk_size: Target number of tokens per chunk
+        overlap: Number of tokens to overlap between chunks
+    
+    Returns:
+        Tuple of (cleaned text, iterator of chunk offsets into it)
+    """
+    # Single-space separators make every joined chunk an exact substring
+    text = ' '.join(clean_text(text).split())
+    return text, _iter_chunk_spans(text, chunk_size, overlap)
+
+def _iter_chunk_spans(text: str, chunk_size: int, overlap: int) -> Iterator[Tuple[int, int]]:
+    """Yield chunk offsets in order while scanning the words of text once"""
+    step = chunk_size - overlap
+    
+    # Chunks that have started but not yet reached chunk_size words: (first word index, start offset)
+    open_chunks = deque()
+    last_end = 0
+    
+    for word_idx, match in enumerate(WORD_PATTERN.finditer(text)):
+        if word_idx % step == 0:
+            open_chunks.append((word_idx, match.start()))
+        last_end = match.end()
         
-        if chunk_text.strip():
-            chunks.append(chunk_text)
+        if open_chunks and word_idx - open_chunks[0][0] == chunk_size - 1:
+            yield open_chunks.popleft()[1], last_end
     
-    return chunks
+    # Trailing chunks shorter than chunk_size end at the last word
+    for _, start in open_chunks:
+        yield start, last_end
 
 def extract_clauses(text: str) -> List[Dict[str, Any]]:
     """
@@ -60,24 +124,23 @@ def extract_clauses(text: str) -> List[Dict[str, Any]]:
         List of dictionaries with clause text and metadata
     """
     clauses = []
-    
-    # Pattern to match clause-like structures
-    clause_patterns = [
-        r'(?:Clause|Section|Article)\s+\d+[\.:]?\s*[A-Z][^.]*\.',
-        r'\d+\.\s*[A-Z][^.]*\.',
-        r'[A-Z][^.]*\.',
-    ]
-    
-    for pattern in clause_patterns:
-        matches = re.finditer(pattern, text, re.MULTILINE | re.DOTALL)
-        for match in matches:
+    seen_spans = set()
+    
+    # Patterns overlap, so each one scans the text; a span already reported by a
+    # more specific pattern is not repeated
+    for pattern in CLAUSE_PATTERNS:
+        for match in pattern.finditer(text):
+            span = match.span()
+            if span in seen_spans:
+                continue
             clause_text = match.group().strip()
             if len(clause_text) > 10:  # Filter out very short matches
+                seen_spans.add(span)
                 clauses.append({
                     'text': clause_text,
                     'start': match.start(),
                     'end': match.end(),
-                    'pattern': pattern
+                    'pattern': pattern.pattern
                 })
     
     return clauses
@@ -89,6 +152,14 @@ def count_tokens(text: str) -> int:
     # Simple word count (no tiktoken dependency)
     return len(text.split())
 
+# Fallback texts used by format_response
+FALLBACK_ANSWER = "Unable to determine answer from the provided document."
+SHORT_ANSWER_FALLBACK = "The information is not available in the provided document."
+FALLBACK_CLAUSE = "No specific clause identified in the document."
+FALLBACK_REASONING = "Based on analysis of the provided document content."
+UNAVAILABLE_CLAUSE = "No relevant clause found in the document."
+UNAVAILABLE_REASONING = "The requested information is not explicitly stated in the provided document."
+
 def format_response(answer: str, source_clause: str, reasoning: str) -> dict:
     """
     Format response with enhanced validation for competition quality.
@@ -101,29 +172,24 @@ def format_response(answer: str, source_clause: str, reasoning: str) -> dict:
     Returns:
         Formatted response dictionary
     """
-    # Validate and clean inputs
-    if not answer or answer.strip() == "":
-        answer = "Unable to determine answer from the provided document."
-    
-    if not source_clause or source_clause.strip() == "":
-        source_clause = "No specific clause identified in the document."
-    
-    if not reasoning or reasoning.strip() == "":
-        reasoning = "Based on analysis of the provided document content."
-    
-    # Ensure proper formatting
-    formatted_response = {
-        "answer": answer.strip(),
-        "source_clause": source_clause.strip(),
-        "reasoning": reasoning.strip()
+    answer = answer.strip() if answer else ""
+    
+    # Missing or too-short answers are reported as unavailable, whatever the clause says
+    if not answer:
+        answer = FALLBACK_ANSWER
+    elif len(answer) < 10:
+        answer = SHORT_ANSWER_FALLBACK
+    else:
+        lowered = answer.lower()
+        if "not available" not in lowered and "unable to" not in lowered:
+            return {
+                "answer": answer,
+                "source_clause": (source_clause.strip() if source_clause else "") or FALLBACK_CLAUSE,
+                "reasoning": (reasoning.strip() if reasoning else "") or FALLBACK_REASONING
+            }
+    
+    return {
+        "answer": answer,
+        "source_clause": UNAVAILABLE_CLAUSE,
+        "reasoning": UNAVAILABLE_REASONING
     }
-    
-    # Quality checks
-    if len(formatted_response["answer"]) < 10:
-        formatted_response["answer"] = "The information is not available in the provided document."
-    
-    if "not available" in formatted_response["answer"].lower() or "unable to" in formatted_response["answer"].lower():
-        formatted_response["source_clause"] = "No relevant clause found in the document."
-        formatted_response["reasoning"] = "The requested information is not explicitly stated in the provided document."
-    
-    return formatted_response 
\ No newline at end of file